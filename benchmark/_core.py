@@ -0,0 +1,563 @@
+"""Test data generation, tool runners and reporting shared by compare.py."""
+import os
+import select
+import string
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+# numpy, psutil and the process pool machinery are imported inside the
+# functions that use them, so `compare.py --help` and argument errors don't
+# pay for loading them.
+
+try:
+    import _fastgen  # optional C generator, built with benchmark/setup.py
+except ImportError:
+    _fastgen = None
+
+HAVE_FASTGEN = _fastgen is not None
+
+# Line that terminates each response from a persistent search server
+SENTINEL = b"---END---\n"
+
+# Read size for draining tool output
+CHUNK_SIZE = 64 * 1024
+
+# Seconds between samples of a spawned tool's memory
+MEM_SAMPLE_INTERVAL = 0.005
+
+# grep has no server mode, so emulate one: run a grep per request line, with
+# the tab-separated arguments split back out, and terminate its output. This
+# still pays grep's process startup on every request, which greprs's server
+# does not, so persistent timings favour greprs.
+GREP_SERVER_SCRIPT = r"""set -f
+IFS="$(printf '\t')"
+while read -r line; do
+    grep $line
+    printf '%s\n' '---END---'
+done"""
+
+# Characters used for random filler lines in generated test files. Filler is
+# sliced out of one pool of random bytes mapped onto the alphabet with this
+# 256-entry translation table (a slight bias toward early letters is fine).
+FILLER_ALPHABET = (string.ascii_letters + " \t").encode()
+FILLER_TABLE = (FILLER_ALPHABET * (256 // len(FILLER_ALPHABET) + 1))[:256]
+FILLER_POOL_SIZE = 4 * 1024 * 1024
+
+FILE_EXTENSIONS = (".txt", ".log", ".rs", ".py", ".md")
+
+# Line templates for generated test files. Matching lines contain the pattern;
+# the rest look like realistic log/code content, plus a random filler line
+# picked with index len(CONTENT_TEMPLATES).
+MATCH_TEMPLATES = (
+    "Error: {pattern} occurred at line {line_num}\n",
+    "Found {pattern} in processing\n",
+    "DEBUG: {pattern} validation successful\n",
+    "Warning: {pattern} deprecated\n",
+)
+CONTENT_TEMPLATES = (
+    "INFO: Processing item {line_num} completed successfully\n",
+    "DEBUG: Function call_handler() returned status=OK\n",
+    "WARN: Cache miss for key 'item_{item}'\n",
+    "// TODO: Implement better error handling here\n",
+    "let result = process_data(input_{line_num});\n",
+)
+
+class BenchmarkResult:
+    def __init__(self, tool, iteration, elapsed, peak_mem, matches):
+        # peak_mem is None when the run's memory can't be measured
+        self.tool = tool
+        self.iteration = iteration
+        self.elapsed = elapsed
+        self.peak_mem = peak_mem
+        self.matches = matches
+
+def _generate_lines(rng, filler_pool, lines_per_file, pattern_frequency, pattern):
+    """Build one file's lines with NumPy-drawn randomness (fallback for `_fastgen`)."""
+    # Draw the whole file's randomness up front rather than per line
+    is_match = rng.random(lines_per_file) < pattern_frequency
+    match_idx = rng.integers(0, len(MATCH_TEMPLATES), size=lines_per_file)
+    content_idx = rng.integers(0, len(CONTENT_TEMPLATES) + 1, size=lines_per_file)
+    items = rng.integers(1000, 10000, size=lines_per_file)
+    filler_start = rng.integers(0, FILLER_POOL_SIZE - 80, size=lines_per_file)
+    filler_end = filler_start + rng.integers(20, 81, size=lines_per_file)
+
+    lines = [None] * lines_per_file
+    draws = zip(is_match.tolist(), match_idx.tolist(), content_idx.tolist(), items.tolist(),
+                filler_start.tolist(), filler_end.tolist())
+    for line_num, (matched, m, c, item, start, end) in enumerate(draws):
+        if matched:
+            line = MATCH_TEMPLATES[m].format(pattern=pattern, line_num=line_num)
+        elif c < len(CONTENT_TEMPLATES):
+            line = CONTENT_TEMPLATES[c].format(line_num=line_num, item=item)
+        else:
+            line = filler_pool[start:end] + "\n"
+        lines[line_num] = line
+    return lines
+
+def generate_test_files(directory: Path, num_files: int, lines_per_file: int, pattern_frequency: float, 
+                       include_binary: bool = False, include_subdirs: bool = True, seed=None):
+    """Generate test files with various formats and structures."""
+    import numpy as np
+    pattern = "TEST_PATTERN"
+    rng = np.random.default_rng(seed)
+    if not HAVE_FASTGEN:
+        filler_pool = rng.bytes(FILLER_POOL_SIZE).translate(FILLER_TABLE).decode()
+    
+    # Create subdirectories if requested
+    subdirs = [directory]
+    if include_subdirs and num_files > 10:
+        subdir1 = directory / "subdir1"
+        subdir2 = directory / "subdir2" 
+        subdir1.mkdir()
+        subdir2.mkdir()
+        subdirs.extend([subdir1, subdir2])
+    
+    files_per_dir = num_files // len(subdirs)
+    
+    total_files = 0
+    written_lines = 0
+    for i, base_dir in enumerate(subdirs):
+        start_idx = i * files_per_dir
+        end_idx = start_idx + files_per_dir
+        if i == len(subdirs) - 1:  # Last directory gets remaining files
+            end_idx = num_files
+            
+        for j in range(start_idx, end_idx):
+            ext = FILE_EXTENSIONS[rng.integers(len(FILE_EXTENSIONS))]
+            fp = base_dir / f"test_{j}{ext}"
+
+            # Assemble the whole file in memory and write it with one call
+            if HAVE_FASTGEN:
+                file_seed = int(rng.integers(2**63))
+                written_lines += _fastgen.write_file(fp, lines_per_file, pattern_frequency,
+                                                     file_seed, pattern)
+            else:
+                lines = _generate_lines(rng, filler_pool, lines_per_file, pattern_frequency, pattern)
+                fp.write_bytes("".join(lines).encode())
+                written_lines += len(lines)
+            total_files += 1
+            
+        # Add some binary files if requested
+        if include_binary and i == 0:
+            binary_file = base_dir / f"binary_{i}.bin"
+            # Write some binary data with occasional text
+            text = f"TEXT_{pattern}_HERE\n".encode()
+            binary_file.write_bytes(b"".join(
+                text if is_text else rng.bytes(50) for is_text in rng.random(100) < 0.1
+            ))
+
+    # Validation, from what was written rather than re-reading the files
+    if written_lines != num_files * lines_per_file:
+        raise RuntimeError(f"Expected {num_files * lines_per_file} lines, wrote {written_lines}")
+    found_files = sum(1 for _, _, names in os.walk(directory) for name in names if name.startswith("test_"))
+    if found_files != total_files:
+        raise RuntimeError(f"Expected {total_files} files, found {found_files}")
+
+def warm_cache(directory: Path):
+    """Read every file under `directory` once so both tools start from a warm page cache."""
+    for root, _, names in os.walk(directory):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                while f.read(1024 * 1024):
+                    pass
+
+def drop_caches():
+    """Flush dirty pages and drop the page cache (Linux, root only)."""
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+# Core reserved for the benchmarked tools by `isolate_core`, if any
+_PIN_CORE = None
+
+def isolate_core(core):
+    """Reserve `core` for the benchmarked tools and move the harness off it (Linux only)."""
+    global _PIN_CORE
+    others = os.sched_getaffinity(0) - {core}
+    os.sched_setaffinity(0, others)
+    _PIN_CORE = core
+
+@contextmanager
+def _on_pinned_core():
+    """Spawn children inside this block on the core reserved by `isolate_core`."""
+    if _PIN_CORE is None:
+        yield
+        return
+    # Children inherit the spawning thread's affinity
+    harness = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, {_PIN_CORE})
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, harness)
+
+class MatchCounter:
+    """Count matches in a tool's output as it streams in, without keeping it.
+
+    Plain output counts one match per line; with `count_only` the `-c`
+    per-file counts (the last `:`-separated field of each line) are summed.
+    """
+    def __init__(self, count_only=False):
+        self.count_only = count_only
+        self.matches = 0
+        self._tail = b""
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        if self.count_only:
+            lines = (self._tail + chunk).split(b"\n")
+            self._tail = lines.pop()
+            self.matches += sum(int(line.rsplit(b":", 1)[-1]) for line in lines if line)
+        else:
+            # Count newlines in C rather than materializing a list of lines
+            self.matches += chunk.count(b"\n")
+            self._tail = chunk[-1:].strip(b"\n")
+
+    def finish(self):
+        """Account for an unterminated final line and return the total."""
+        if self._tail:
+            self.feed(b"\n")
+        return self.matches
+
+def _sample_peak_rss(pid):
+    """Return `pid`'s own peak RSS so far in MB, or None once it has exited.
+
+    wait4's ru_maxrss can't be used for this: Linux folds the spawning
+    process's high-water mark into it at exec, so it reports the harness.
+    """
+    if sys.platform.startswith("linux"):
+        # VmHWM only covers the memory of the exec'd image, and is a running
+        # peak, so nothing between samples is missed
+        try:
+            with open(f"/proc/{pid}/status", "rb") as f:
+                for line in f:
+                    if line.startswith(b"VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    import psutil
+    try:
+        return psutil.Process(pid).memory_info().rss / 1024**2
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+
+def spawn_and_wait(cmd, on_output):
+    """Run `cmd` to completion, passing its stdout to `on_output` in chunks.
+
+    Returns the child's peak RSS in MB, sampled after each read and every
+    `MEM_SAMPLE_INTERVAL` while it runs, or None if no sample succeeded
+    before it exited. Growth after the last sample is missed.
+    """
+    if not hasattr(os, "posix_spawnp"):
+        # Windows: no posix_spawn, so read the peak working set once
+        import psutil
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        with proc.stdout:
+            while chunk := proc.stdout.read(CHUNK_SIZE):
+                on_output(chunk)
+        proc.wait()
+        try:
+            return psutil.Process(proc.pid).memory_info().peak_wset / 1024**2
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    # posix_spawn avoids copying the harness's page tables on every run. Its
+    # vfork-style clone execs from the harness's own address space, so the
+    # child's rusage starts at the harness's peak RSS; see _sample_peak_rss.
+    read_fd, write_fd = os.pipe()
+    file_actions = [
+        (os.POSIX_SPAWN_DUP2, write_fd, 1),
+        (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+    ]
+    try:
+        with _on_pinned_core():
+            pid = os.posix_spawnp(cmd[0], cmd, os.environ, file_actions=file_actions)
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+
+    peak_mem = None
+    try:
+        while True:
+            ready, _, _ = select.select([read_fd], [], [], MEM_SAMPLE_INTERVAL)
+            if ready:
+                chunk = os.read(read_fd, CHUNK_SIZE)
+                if not chunk:
+                    break
+            # Sample after each read too: a tool's last output is usually
+            # flushed just before it exits
+            sample = _sample_peak_rss(pid)
+            if sample is not None:
+                peak_mem = sample if peak_mem is None else max(peak_mem, sample)
+            if ready:
+                on_output(chunk)
+    finally:
+        os.close(read_fd)
+    os.waitpid(pid, 0)
+    return peak_mem
+
+def build_args(pattern, target, extra_args=(), count_only=False):
+    """Build the arguments (after the program name) for one recursive search.
+
+    Built once per search and reused across iterations, so the per-run path
+    does no list building or Path conversion.
+    """
+    count_flag = ("-c",) if count_only else ()
+    return ("-r", *count_flag, *extra_args, pattern, str(target))
+
+def run_grep_command(argv, iteration, tool_name, count_only=False):
+    """Run a full grep/greprs command line, e.g. `(program, *build_args(...))`."""
+    counter = MatchCounter(count_only)
+    start = time.time()
+    try:
+        peak_mem = spawn_and_wait(argv, counter.feed)
+    except FileNotFoundError:
+        print(f"ERROR: `{argv[0]}` not found. Point `--greprs-bin` at your binary or install it on PATH.")
+        sys.exit(1)
+    elapsed = time.time() - start
+    return BenchmarkResult(tool_name, iteration, elapsed, peak_mem, counter.finish())
+
+def start_server(cmd):
+    """Launch a long-lived search process that reads one request per stdin line."""
+    try:
+        with _on_pinned_core():
+            return subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+    except FileNotFoundError:
+        print(f"ERROR: `{cmd[0]}` not found. Point `--greprs-bin` at your binary or install it on PATH.")
+        sys.exit(1)
+
+def stop_server(proc_handle):
+    proc_handle.stdin.close()
+    proc_handle.wait()
+
+def run_once(proc_handle, args, iteration, tool_name, count_only=False):
+    """Run one search (arguments from `build_args`) through a server from `start_server`.
+
+    No memory is reported: the server's RSS is neither a per-request peak nor,
+    for the grep stand-in, the RSS of grep itself.
+    """
+    request = "\t".join(args).encode() + b"\n"
+
+    unsupported = (f"{tool_name} server exited unexpectedly "
+                   "(does it support `--server`? try --no-persistent)")
+
+    counter = MatchCounter(count_only)
+    start = time.time()
+    try:
+        proc_handle.stdin.write(request)
+    except BrokenPipeError:
+        raise RuntimeError(unsupported) from None
+    fd = proc_handle.stdout.fileno()
+    # Stream output into the counter, holding back the last len(SENTINEL)
+    # bytes until we know whether they are the terminating sentinel line
+    pending = b""
+    last_fed = b""
+    while not (pending == SENTINEL and last_fed in (b"", b"\n")):
+        chunk = os.read(fd, CHUNK_SIZE)
+        if not chunk:
+            raise RuntimeError(unsupported)
+        pending += chunk
+        if len(pending) > len(SENTINEL):
+            data = pending[:-len(SENTINEL)]
+            counter.feed(data)
+            last_fed = data[-1:]
+            pending = pending[-len(SENTINEL):]
+    elapsed = time.time() - start
+    return BenchmarkResult(tool_name, iteration, elapsed, None, counter.finish())
+
+# Shared worker pool for parallel iterations, created on first use
+_POOL = None
+
+# Per-process tool state used by `_run_pair`: the greprs binary, whether to
+# drop caches before each run and, in persistent mode, this process's own
+# grep/greprs servers
+_WORKER = {}
+
+def _start_tools(greprs_bin, persistent, cold_cache=False):
+    _WORKER["greprs_bin"] = greprs_bin
+    _WORKER["cold_cache"] = cold_cache
+    if persistent:
+        _WORKER["grep_server"] = start_server(["sh", "-c", GREP_SERVER_SCRIPT])
+        _WORKER["greprs_server"] = start_server([greprs_bin, "--server"])
+
+def _stop_tools():
+    for key in ("grep_server", "greprs_server"):
+        if key in _WORKER:
+            stop_server(_WORKER.pop(key))
+
+def _init_worker(greprs_bin, persistent):
+    """Pool initializer: start this worker's tools.
+
+    Workers are not pinned to cores, since the tools would inherit the pin and
+    greprs's parallel search would be limited to one core.
+    """
+    # Servers left running when the worker exits see EOF on stdin and quit
+    _start_tools(greprs_bin, persistent)
+
+def _available_cores():
+    import psutil
+    if hasattr(psutil.Process, "cpu_affinity"):
+        return psutil.Process().cpu_affinity()
+    return list(range(os.cpu_count() or 1))
+
+def _get_pool(max_workers, initargs):
+    from concurrent.futures import ProcessPoolExecutor
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                    initargs=initargs)
+    return _POOL
+
+def _run_pair(job):
+    """Run one grep and one greprs iteration with this process's tools."""
+    iteration, args, count_only = job
+    if "greprs_server" in _WORKER:
+        runs = [("grep", partial(run_once, _WORKER["grep_server"], args)),
+                ("greprs", partial(run_once, _WORKER["greprs_server"], args))]
+    else:
+        runs = [("grep", partial(run_grep_command, ("grep", *args))),
+                ("greprs", partial(run_grep_command, (_WORKER["greprs_bin"], *args)))]
+
+    results = []
+    for tool_name, run in runs:
+        if _WORKER["cold_cache"]:
+            drop_caches()
+        results.append(run(iteration, tool_name, count_only=count_only))
+    g, r = results
+    return iteration, g, r
+
+# Two-sided 95% Student-t critical values, indexed by degrees of freedom
+# (index 0 unused); larger dof fall back to the last, slightly conservative, entry
+_T_CRIT_95 = (
+    None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)
+
+def converged(pairs, ci_target, min_iterations=5):
+    """True once the 95% CI half-width on mean time is below `ci_target` of the mean for both tools."""
+    import numpy as np
+    n = len(pairs)
+    if ci_target <= 0 or n < min_iterations:
+        return False
+    t_crit = _T_CRIT_95[min(n - 1, len(_T_CRIT_95) - 1)]
+    for tool in (1, 2):
+        elapsed = np.array([pair[tool].elapsed for pair in pairs])
+        mean = elapsed.mean()
+        half_width = t_crit * elapsed.std(ddof=1) / np.sqrt(n)
+        if mean <= 0 or half_width / mean >= ci_target:
+            return False
+    return True
+
+def run_iterations(jobs, greprs_bin, persistent, parallel=False, cold_cache=False, ci_target=0.0):
+    """Run `(iteration, args, count_only)` jobs, returning results in iteration order.
+
+    Jobs run one at a time in this process unless `parallel`, in which case
+    they run concurrently across the shared pool and so compete for cores,
+    memory bandwidth and page cache. Stops early once
+    `converged(..., ci_target)` holds for the results so far.
+    """
+    pairs = []
+    if not parallel:
+        _start_tools(greprs_bin, persistent, cold_cache)
+        for job in jobs:
+            pairs.append(_run_pair(job))
+            if converged(pairs, ci_target):
+                break
+        _stop_tools()
+        return pairs
+
+    from concurrent.futures import as_completed, wait
+
+    workers = min(len(jobs), max(1, len(_available_cores()) // 2))
+    pool = _get_pool(workers, (greprs_bin, persistent))
+    futures = [pool.submit(_run_pair, job) for job in jobs]
+    try:
+        for future in as_completed(futures):
+            pairs.append(future.result())
+            if converged(pairs, ci_target):
+                # Cancel queued runs and, as below, let in-flight ones finish
+                # before the caller removes the test data
+                wait([f for f in futures if not f.cancel()])
+                break
+    except BaseException:
+        # Let in-flight runs finish before the caller removes the test data
+        global _POOL
+        _POOL = None
+        pool.shutdown(cancel_futures=True)
+        raise
+    pairs.sort(key=lambda pair: pair[0])
+    return pairs
+
+def print_iteration_table(results):
+    show_mem = any(r.peak_mem is not None for r in results)
+    mem_header = f" {'Mem (MB)':>10}" if show_mem else ""
+    header = f"{'Tool':<8} {'Iter':>4} {'Time (s)':>10}{mem_header} {'Matches':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        mem = ""
+        if show_mem:
+            mem = f" {'-':>10}" if r.peak_mem is None else f" {r.peak_mem:>10.1f}"
+        print(f"{r.tool:<8} {r.iteration:>4} {r.elapsed:>10.4f}{mem} {r.matches:>8}")
+
+def summarize(data):
+    """Return ((time mean, σ), (mem mean, σ)) over a list of results.
+
+    Memory statistics cover only the results with a memory figure, and are
+    None when there are none.
+    """
+    import numpy as np
+    elapsed = np.array([d.elapsed for d in data])
+    mem = np.array([d.peak_mem for d in data if d.peak_mem is not None])
+
+    def mean_std(arr):
+        return arr.mean(), arr.std(ddof=1) if arr.size > 1 else 0.0
+
+    return mean_std(elapsed), (mean_std(mem) if mem.size else None)
+
+def print_summary(grep_res, greprs_res):
+    grep_stats = summarize(grep_res)
+    greprs_stats = summarize(greprs_res)
+
+    show_mem = grep_stats[1] is not None or greprs_stats[1] is not None
+
+    print("\n=== PERFORMANCE SUMMARY ===")
+    tools = [("grep", grep_res, grep_stats), ("greprs", greprs_res, greprs_stats)]
+    mem_header = f" {'Avg Mem':>10} {'σ Mem':>8}" if show_mem else ""
+    header = f"{'Tool':<8} {'Avg Time (s)':>12} {'σ Time':>8}{mem_header} {'Matches':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, data, ((tmean, tstd), mem_stats) in tools:
+        matches = data[0].matches if data else 0
+        mem = ""
+        if show_mem and mem_stats is None:
+            mem = f" {'-':>10} {'-':>8}"
+        elif show_mem:
+            mem = f" {mem_stats[0]:10.1f} {mem_stats[1]:8.1f}"
+        print(f"{name:<8} {tmean:12.4f} {tstd:8.4f}{mem} {matches:8}")
+
+    if grep_res and greprs_res:
+        t_g, t_r = grep_stats[0][0], greprs_stats[0][0]
+        time_diff = (t_r / t_g - 1) * 100 if t_g > 0 else 0
+
+        print(f"\nRelative to grep:")
+        print(f"  Time:   {'faster' if time_diff < 0 else 'slower'} by {abs(time_diff):.1f}%")
+        if grep_stats[1] is not None and greprs_stats[1] is not None:
+            m_g, m_r = grep_stats[1][0], greprs_stats[1][0]
+            mem_diff = (m_r / m_g - 1) * 100 if m_g > 0 else 0
+            print(f"  Memory: {'less' if mem_diff < 0 else 'more'} by {abs(mem_diff):.1f}%")
+
+        if grep_res[0].matches != greprs_res[0].matches:
+            print(f"\nWARNING: Match counts differ!")
+            print(f"  grep   : {grep_res[0].matches}")
+            print(f"  greprs : {greprs_res[0].matches}")
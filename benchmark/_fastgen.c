@@ -0,0 +1,240 @@
+/*
+ * Optional C fast path for generate_test_files() in _core.py.
+ *
+ * write_file() builds one test file in memory with the same line mix as the
+ * NumPy generator and writes it with a single fwrite. Keep the templates
+ * below in sync with MATCH_TEMPLATES and CONTENT_TEMPLATES in _core.py.
+ *
+ * Build in place with:  python setup.py build_ext --inplace
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <errno.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+static const char FILLER_ALPHABET[] =
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ \t";
+#define FILLER_ALPHABET_LEN (sizeof(FILLER_ALPHABET) - 1)
+
+/* Longest fixed text in any template, plus room for a formatted number */
+#define MAX_LINE_OVERHEAD 128
+
+typedef struct {
+    char *data;
+    size_t len;
+    size_t cap;
+} Buffer;
+
+static int buf_reserve(Buffer *buf, size_t extra)
+{
+    size_t cap = buf->cap ? buf->cap : 1 << 16;
+    char *data;
+
+    if (buf->len + extra <= buf->cap)
+        return 1;
+    while (cap < buf->len + extra)
+        cap *= 2;
+    data = realloc(buf->data, cap);
+    if (data == NULL)
+        return 0;
+    buf->data = data;
+    buf->cap = cap;
+    return 1;
+}
+
+static void buf_put(Buffer *buf, const char *s, size_t n)
+{
+    memcpy(buf->data + buf->len, s, n);
+    buf->len += n;
+}
+
+#define BUF_PUT_LITERAL(buf, s) buf_put((buf), (s), sizeof(s) - 1)
+
+static void buf_put_u64(Buffer *buf, uint64_t value)
+{
+    char digits[20];
+    size_t n = 0;
+
+    do {
+        digits[n++] = (char)('0' + value % 10);
+        value /= 10;
+    } while (value);
+    while (n)
+        buf->data[buf->len++] = digits[--n];
+}
+
+/* SplitMix64: small, fast and good enough for filler text */
+static uint64_t next_u64(uint64_t *state)
+{
+    uint64_t z = (*state += 0x9E3779B97F4A7C15ULL);
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+static double next_unit(uint64_t *state)
+{
+    return (double)(next_u64(state) >> 11) * (1.0 / 9007199254740992.0);
+}
+
+static void put_filler(Buffer *buf, uint64_t *state)
+{
+    size_t len = 20 + (size_t)(next_u64(state) % 61);
+    size_t i;
+
+    for (i = 0; i < len; i++)
+        buf->data[buf->len++] = FILLER_ALPHABET[next_u64(state) % FILLER_ALPHABET_LEN];
+}
+
+static int generate(Buffer *buf, Py_ssize_t lines, double pattern_frequency, uint64_t seed,
+                    const char *pattern, size_t pattern_len)
+{
+    uint64_t state = seed;
+    Py_ssize_t line_num;
+
+    for (line_num = 0; line_num < lines; line_num++) {
+        if (!buf_reserve(buf, MAX_LINE_OVERHEAD + pattern_len))
+            return 0;
+
+        if (next_unit(&state) < pattern_frequency) {
+            switch (next_u64(&state) % 4) {
+            case 0:
+                BUF_PUT_LITERAL(buf, "Error: ");
+                buf_put(buf, pattern, pattern_len);
+                BUF_PUT_LITERAL(buf, " occurred at line ");
+                buf_put_u64(buf, (uint64_t)line_num);
+                break;
+            case 1:
+                BUF_PUT_LITERAL(buf, "Found ");
+                buf_put(buf, pattern, pattern_len);
+                BUF_PUT_LITERAL(buf, " in processing");
+                break;
+            case 2:
+                BUF_PUT_LITERAL(buf, "DEBUG: ");
+                buf_put(buf, pattern, pattern_len);
+                BUF_PUT_LITERAL(buf, " validation successful");
+                break;
+            default:
+                BUF_PUT_LITERAL(buf, "Warning: ");
+                buf_put(buf, pattern, pattern_len);
+                BUF_PUT_LITERAL(buf, " deprecated");
+                break;
+            }
+        } else {
+            switch (next_u64(&state) % 6) {
+            case 0:
+                BUF_PUT_LITERAL(buf, "INFO: Processing item ");
+                buf_put_u64(buf, (uint64_t)line_num);
+                BUF_PUT_LITERAL(buf, " completed successfully");
+                break;
+            case 1:
+                BUF_PUT_LITERAL(buf, "DEBUG: Function call_handler() returned status=OK");
+                break;
+            case 2:
+                BUF_PUT_LITERAL(buf, "WARN: Cache miss for key 'item_");
+                buf_put_u64(buf, 1000 + next_u64(&state) % 9000);
+                BUF_PUT_LITERAL(buf, "'");
+                break;
+            case 3:
+                BUF_PUT_LITERAL(buf, "// TODO: Implement better error handling here");
+                break;
+            case 4:
+                BUF_PUT_LITERAL(buf, "let result = process_data(input_");
+                buf_put_u64(buf, (uint64_t)line_num);
+                BUF_PUT_LITERAL(buf, ");");
+                break;
+            default:
+                put_filler(buf, &state);
+                break;
+            }
+        }
+        buf->data[buf->len++] = '\n';
+    }
+    return 1;
+}
+
+static int write_all(const char *path, const Buffer *buf)
+{
+    FILE *fp = fopen(path, "wb");
+    int ok;
+
+    if (fp == NULL)
+        return 0;
+    ok = fwrite(buf->data, 1, buf->len, fp) == buf->len;
+    if (fclose(fp) != 0)
+        ok = 0;
+    return ok;
+}
+
+PyDoc_STRVAR(write_file_doc,
+"write_file(path, lines_per_file, pattern_frequency, seed, pattern) -> int\n\n"
+"Write one generated test file and return the number of lines written.");
+
+static PyObject *write_file(PyObject *self, PyObject *args)
+{
+    PyObject *path;
+    Py_ssize_t lines;
+    double pattern_frequency;
+    unsigned long long seed;
+    const char *pattern;
+    Py_ssize_t pattern_len;
+    Buffer buf = {NULL, 0, 0};
+    const char *path_str;
+    int generated, written = 0, saved_errno = 0;
+
+    if (!PyArg_ParseTuple(args, "O&ndKs#", PyUnicode_FSConverter, &path, &lines,
+                          &pattern_frequency, &seed, &pattern, &pattern_len))
+        return NULL;
+    if (lines < 0) {
+        Py_DECREF(path);
+        PyErr_SetString(PyExc_ValueError, "lines_per_file must be non-negative");
+        return NULL;
+    }
+    path_str = PyBytes_AS_STRING(path);
+
+    Py_BEGIN_ALLOW_THREADS
+    generated = generate(&buf, lines, pattern_frequency, (uint64_t)seed, pattern,
+                         (size_t)pattern_len);
+    if (generated) {
+        errno = 0;
+        written = write_all(path_str, &buf);
+        saved_errno = errno;
+    }
+    Py_END_ALLOW_THREADS
+
+    free(buf.data);
+    if (!generated) {
+        Py_DECREF(path);
+        return PyErr_NoMemory();
+    }
+    if (!written) {
+        errno = saved_errno ? saved_errno : EIO;
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path);
+        Py_DECREF(path);
+        return NULL;
+    }
+    Py_DECREF(path);
+    return PyLong_FromSsize_t(lines);
+}
+
+static PyMethodDef fastgen_methods[] = {
+    {"write_file", write_file, METH_VARARGS, write_file_doc},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef fastgen_module = {
+    PyModuleDef_HEAD_INIT,
+    "_fastgen",
+    "C fast path for benchmark test data generation.",
+    -1,
+    fastgen_methods,
+};
+
+PyMODINIT_FUNC PyInit__fastgen(void)
+{
+    return PyModule_Create(&fastgen_module);
+}
@@ -0,0 +1,9 @@
+# Builds the optional C fast path for test data generation:
+#   cd benchmark && python setup.py build_ext --inplace
+# compare.py falls back to the NumPy generator when it is not built.
+from setuptools import Extension, setup
+
+setup(
+    name="greprs-benchmark-fastgen",
+    ext_modules=[Extension("_fastgen", ["_fastgen.c"])],
+)
@@ -1,7 +1,11 @@
 pub mod cli;
+pub mod runner;
 pub mod search;
+pub mod server;
 pub mod utils;
 
 pub use cli::CliArgs;
+pub use runner::run;
 pub use search::{SearchConfig, visit_path};
+pub use server::serve;
 pub use utils::{build_regex, RegexConfig};
@@ -0,0 +1,63 @@
+use crate::cli::CliArgs;
+use crate::runner::run;
+use clap::Parser;
+use std::io::{self, BufRead, Write};
+
+/// Line written after the output of every request in server mode
+pub const SENTINEL: &str = "---END---";
+
+/// Writer that remembers the last byte passed through it
+struct LastByte<'a, W: Write> {
+    inner: &'a mut W,
+    last: Option<u8>,
+}
+
+impl<W: Write> Write for LastByte<'_, W> {
+    fn write(&mut self, buf: &[u8]) -> io::Result<usize> {
+        let n = self.inner.write(buf)?;
+        if n > 0 {
+            self.last = Some(buf[n - 1]);
+        }
+        Ok(n)
+    }
+
+    fn flush(&mut self) -> io::Result<()> {
+        self.inner.flush()
+    }
+}
+
+/// Serve searches from `input` until EOF.
+///
+/// Each request is one line holding tab-separated arguments, exactly as they
+/// would follow `greprs` on the command line. The output of every request is
+/// followed by a `SENTINEL` line and flushed, so a client can drive many
+/// searches through a single long-lived process. The sentinel always starts
+/// a line of its own, even when the output ends without a newline (`--null`).
+pub fn serve<R: BufRead, W: Write>(input: R, writer: &mut W) -> io::Result<()> {
+    for line in input.lines() {
+        let line = line?;
+        let mut output = LastByte { inner: &mut *writer, last: None };
+
+        if line.is_empty() {
+            // Still terminated, so a client waiting on the response can't hang
+            eprintln!("greprs: empty request");
+        } else {
+            let argv = std::iter::once("greprs").chain(line.split('\t'));
+            match CliArgs::try_parse_from(argv) {
+                Ok(args) => {
+                    if let Err(err) = run(&args, &mut output) {
+                        eprintln!("greprs: {}", err);
+                    }
+                }
+                Err(err) => eprintln!("greprs: {}", err),
+            }
+        }
+
+        if matches!(output.last, Some(byte) if byte != b'\n') {
+            writeln!(writer)?;
+        }
+        writeln!(writer, "{}", SENTINEL)?;
+        writer.flush()?;
+    }
+    Ok(())
+}
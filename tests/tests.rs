@@ -2,7 +2,8 @@
 mod tests {
     use greprs::{
         utils::{build_regex, RegexConfig},
-        search::{SearchConfig, visit_path}
+        search::{SearchConfig, visit_path},
+        server::{serve, SENTINEL}
     };
     use std::fs::{self, File};
     use std::io::{self, Write};
@@ -440,4 +441,36 @@ mod tests {
         
         Ok(())
     }
+
+    #[test]
+    fn test_server_mode() -> io::Result<()> {
+        let dir = tempfile::tempdir()?;
+        let test_file = dir.path().join("test.txt");
+        let mut file = File::create(&test_file)?;
+        
+        writeln!(file, "Hello World")?;
+        writeln!(file, "Another line")?;
+        writeln!(file, "Hello again")?;
+        
+        // Two requests, then an invalid and an empty one that must still be
+        // terminated, then one whose output ends without a newline
+        let path = test_file.display();
+        let input = format!(
+            "Hello\t{}\n-c\tHello\t{}\n[invalid\t{}\n\n--null\tHello\t{}\n",
+            path, path, path, path
+        );
+        let mut output = Vec::new();
+        serve(input.as_bytes(), &mut output)?;
+        
+        let output_str = String::from_utf8_lossy(&output);
+        let responses: Vec<&str> = output_str.split(&format!("{}\n", SENTINEL)).collect();
+        assert_eq!(responses.len(), 6); // Five responses plus trailing empty string
+        assert_eq!(responses[0], "Hello World\nHello again\n");
+        assert_eq!(responses[1], "2\n");
+        assert_eq!(responses[2], "");
+        assert_eq!(responses[3], "");
+        assert_eq!(responses[4], "Hello World\0Hello again\0\n");
+        
+        Ok(())
+    }
 }